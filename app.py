@@ -7,16 +7,25 @@ Blue Scarf Solutions - First Client Deliverable
 
 import streamlit as st
 import streamlit.components.v1 as components
-from streamlit_js_eval import streamlit_js_eval
+from streamlit.runtime import get_instance as get_runtime
 import datetime
 from PIL import Image
 import io
-import base64
-import json
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+import re
+from pathlib import Path
 
 from modules.ocr import extract_text_from_pdf
 from modules.parser import parse_invoice
-from modules.lookup import lookup_vendor
+from modules.lookup import lookup_vendor, get_lookup
+from modules.stamper import (
+    stamp_pdf_at_position, composite_stamp_preview, format_stamp_date, get_pdf_info,
+    page_has_color, open_pdf
+)
 
 # Page config
 st.set_page_config(
@@ -25,120 +34,18 @@ st.set_page_config(
     layout="wide"
 )
 
+
+@st.cache_resource
+def _load_css() -> str:
+    """Read and minify the app stylesheet once per process."""
+    css = (Path(__file__).parent / "frontend" / "app.css").read_text()
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};])\s*', r'\1', css)
+    return f"<style>{css}</style>"
+
+
 # CSS
-st.markdown("""
-<style>
-    @import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700;800&display=swap');
-    
-    * { font-family: 'Inter', sans-serif; }
-    
-    .main-header {
-        display: flex;
-        justify-content: space-between;
-        align-items: center;
-        padding: 1rem 0;
-        border-bottom: 2px solid #2563eb;
-        margin-bottom: 1.5rem;
-    }
-    .header-left {
-        display: flex;
-        align-items: center;
-        gap: 12px;
-    }
-    .header-title { font-size: 1.4rem; font-weight: 700; color: #1a1a1a; }
-    .header-subtitle { font-size: 0.85rem; color: #64748b; font-weight: 500; }
-    .bss-badge {
-        display: flex;
-        align-items: center;
-        gap: 8px;
-        background: linear-gradient(135deg, #1d4ed8, #2563eb);
-        color: white;
-        padding: 6px 14px;
-        border-radius: 6px;
-        font-size: 0.8rem;
-        font-weight: 600;
-    }
-    .bss-badge img { height: 22px; }
-    .success-card {
-        background: linear-gradient(135deg, #f0fdf4, #dcfce7);
-        border: 2px solid #22c55e;
-        border-radius: 12px;
-        padding: 2rem;
-        text-align: center;
-        box-shadow: 0 4px 15px rgba(34, 197, 94, 0.15);
-    }
-    .success-card h2 { color: #166534; margin-bottom: 0.5rem; }
-    .step-indicator {
-        display: flex;
-        justify-content: center;
-        gap: 10px;
-        margin-bottom: 1.5rem;
-        font-size: 0.85rem;
-    }
-    .step { 
-        padding: 8px 16px; 
-        border-radius: 25px; 
-        background: #f1f5f9;
-        color: #64748b;
-        border: 2px solid transparent;
-        transition: all 0.2s;
-    }
-    .step.active { 
-        background: linear-gradient(135deg, #1d4ed8, #2563eb); 
-        color: white;
-        font-weight: 600;
-        box-shadow: 0 2px 8px rgba(37, 99, 235, 0.4);
-    }
-    .step.done {
-        background: #dcfce7;
-        color: #166534;
-        border-color: #22c55e;
-    }
-    .instructions {
-        background: #f8fafc;
-        border-left: 3px solid #2563eb;
-        padding: 12px 16px;
-        margin: 1rem 0;
-        border-radius: 0 8px 8px 0;
-        font-size: 0.95rem;
-        color: #475569;
-    }
-    .tip {
-        background: #fefce8;
-        border-left: 3px solid #eab308;
-        padding: 10px 14px;
-        margin: 0.5rem 0;
-        border-radius: 0 6px 6px 0;
-        font-size: 0.9rem;
-    }
-    .bss-footer {
-        margin-top: 3rem;
-        padding: 1.5rem 0;
-        border-top: 1px solid #e2e8f0;
-        text-align: center;
-        color: #64748b;
-        font-size: 0.85rem;
-    }
-    .bss-footer a { color: #2563eb; text-decoration: none; }
-    .bss-footer a:hover { text-decoration: underline; }
-    
-    #MainMenu {visibility: hidden;}
-    footer {visibility: hidden;}
-    .stButton > button { 
-        border-radius: 8px; 
-        padding: 0.75rem 1.5rem; 
-        font-weight: 600;
-        transition: all 0.2s;
-    }
-    .stButton > button:hover {
-        transform: translateY(-1px);
-        box-shadow: 0 4px 12px rgba(37, 99, 235, 0.3);
-    }
-    .stButton > button[kind="primary"] {
-        background: linear-gradient(135deg, #1d4ed8, #2563eb);
-    }
-</style>
-""", unsafe_allow_html=True)
+st.markdown(_load_css(), unsafe_allow_html=True)
 
 st.markdown("""
 <div class="main-header">
@@ -152,6 +59,34 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
+# Drag & drop stamp placement component (see frontend/stamp_canvas)
+_stamp_canvas = components.declare_component(
+    "stamp_canvas",
+    path=str(Path(__file__).parent / "frontend" / "stamp_canvas")
+)
+
+# Verify-stage stamp preview (filled with str.format_map)
+_STAMP_PREVIEW_TMPL = """
+<div style="
+    border: 2px solid #333;
+    border-radius: 4px;
+    padding: 12px 15px;
+    background: white;
+    font-family: 'Helvetica', sans-serif;
+    font-size: 13px;
+    line-height: 1.6;
+    max-width: 200px;
+    box-shadow: 2px 2px 5px rgba(0,0,0,0.1);
+">
+    <div><strong>COM:</strong> {com}</div>
+    <div><strong>C.C:</strong> {cc}</div>
+    <div><strong>DUE:</strong> ${due}</div>
+    <div><strong>RET:</strong> ${ret}</div>
+    <div><strong>By:</strong> Alan Sar Shalom</div>
+    <div><strong>Date:</strong> {date}</div>
+</div>
+"""
+
 
 def show_progress(current_step):
     """Show progress indicator with 4 steps"""
@@ -185,43 +120,157 @@ def extract_vendor_from_filename(filename: str) -> str:
     # Remove extension and common suffixes
     name = filename.rsplit('.', 1)[0]
     # Remove common patterns like "PA#1", "Invoice", dates, etc.
-    import re
     name = re.sub(r'[-_]?(PA|Pay\s*App(lication)?|Invoice|INV)[-_#]?\d*', '', name, flags=re.IGNORECASE)
     name = re.sub(r'[-_]?\d{4}[-_]?\d{2}[-_]?\d{2}', '', name)  # Remove dates
     name = re.sub(r'[-_]+', ' ', name).strip()  # Replace separators with spaces
     return name if len(name) > 2 else ""
 
 
-def process_invoice(pdf_bytes: bytes, filename: str):
+@st.cache_data(max_entries=16, show_spinner=False)
+def _extract_invoice(pdf_hash: str, _pdf_path: str, filename: str):
+    """OCR + parse + vendor lookup, keyed on the PDF hash so identical uploads skip OCR."""
+    text = extract_text_from_pdf(pdf_path=_pdf_path)
+    invoice_data = parse_invoice(text)
+    com_id, cost_code, matched_vendor = lookup_vendor(invoice_data.vendor_name)
+    
+    # Fallback: try to match vendor from filename if OCR failed
+    if not matched_vendor:
+        filename_vendor = extract_vendor_from_filename(filename)
+        if filename_vendor:
+            com_id_fb, cost_code_fb, matched_vendor_fb = lookup_vendor(filename_vendor)
+            if matched_vendor_fb:
+                matched_vendor = matched_vendor_fb
+                com_id = com_id_fb or com_id
+                cost_code = cost_code_fb or cost_code
+                invoice_data.vendor_name = filename_vendor
+    
+    if com_id:
+        invoice_data.commitment_id = com_id
+    if cost_code:
+        invoice_data.cost_code = cost_code
+    return invoice_data, matched_vendor
+
+
+def _media_url(data: bytes, mimetype: str, coordinates: str) -> str:
+    """Serve bytes through Streamlit's media endpoint (the mechanism st.image uses).
+    
+    The URL is content-addressed, so the browser keeps its cached copy across reruns.
+    It is root-relative; the stamp canvas resolves it under the server base path.
+    """
+    return get_runtime().media_file_mgr.add(data, mimetype, coordinates)
+
+
+def _option_index(index_map: dict, *candidates) -> int:
+    """Selectbox index of the first candidate found in index_map (0 is the blank option)."""
+    for candidate in candidates:
+        if candidate and candidate in index_map:
+            return index_map[candidate] + 1
+    return 0
+
+
+# Spooled uploads/outputs live in one temp dir per session; leftovers older than this
+# (from a server that was killed before its sessions were cleaned up) are swept at startup
+SPOOL_PREFIX = "payapp_"
+STALE_SPOOL_SECONDS = 24 * 60 * 60
+
+
+@st.cache_resource
+def _sweep_stale_spools():
+    """Once per process: delete spool dirs/files a previous server process left behind."""
+    cutoff = time.time() - STALE_SPOOL_SECONDS
+    for path in Path(tempfile.gettempdir()).glob(f"{SPOOL_PREFIX}*"):
+        try:
+            if path.stat().st_mtime >= cutoff:
+                continue
+            if path.is_dir():
+                shutil.rmtree(path)
+            else:
+                path.unlink()
+        except OSError:
+            pass
+
+
+def _spool_dir() -> str:
+    """This session's private temp dir.
+    
+    TemporaryDirectory removes itself when garbage-collected, so the files go away
+    with the session state - whether the user starts over or the session just ends.
+    """
+    if st.session_state.get('spool_dir') is None:
+        st.session_state.spool_dir = tempfile.TemporaryDirectory(prefix=SPOOL_PREFIX)
+    return st.session_state.spool_dir.name
+
+
+def _spool(data: bytes, suffix: str) -> str:
+    """Write a blob to a file in the session's temp dir and return its path (keeps it out of session state)."""
+    fd, path = tempfile.mkstemp(suffix=suffix, dir=_spool_dir())
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    return path
+
+
+def _discard_spooled(*keys):
+    """Delete the temp files referenced by the given session_state keys."""
+    for key in keys:
+        path = st.session_state.pop(key, None)
+        if path:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+
+def _release_upload():
+    """Close the open PDF handle and delete every temp file belonging to the current upload."""
+    doc = st.session_state.pop('fitz_doc', None)
+    if doc is not None:
+        doc.close()
+    _discard_spooled('pdf_path', 'output_path', 'preview_path')
+
+
+def _pdf_doc():
+    """The uploaded PDF, parsed once and kept open for the rest of the session."""
+    if st.session_state.get('fitz_doc') is None:
+        st.session_state.fitz_doc = open_pdf(pdf_path=st.session_state.pdf_path)
+    return st.session_state.fitz_doc
+
+
+def _render_preview(doc):
+    """Rasterize the page preview at the 800px canvas width used by the position stage."""
+    # Single-channel render only when the page has no color to lose
+    info = get_pdf_info(
+        fit_width=800, image_format="webp", grayscale=not page_has_color(doc=doc), doc=doc
+    )
+    return info['zoom'], info['image'], info['width'], info['height']
+
+
+def process_invoice(pdf_path: str, filename: str, pdf_hash: str):
     with st.spinner("Reading invoice..."):
-        text = extract_text_from_pdf(pdf_bytes=pdf_bytes)
-        invoice_data = parse_invoice(text)
-        com_id, cost_code, matched_vendor = lookup_vendor(invoice_data.vendor_name)
-        
-        # Fallback: try to match vendor from filename if OCR failed
-        if not matched_vendor:
-            filename_vendor = extract_vendor_from_filename(filename)
-            if filename_vendor:
-                com_id_fb, cost_code_fb, matched_vendor_fb = lookup_vendor(filename_vendor)
-                if matched_vendor_fb:
-                    matched_vendor = matched_vendor_fb
-                    com_id = com_id_fb or com_id
-                    cost_code = cost_code_fb or cost_code
-                    invoice_data.vendor_name = filename_vendor
-        
-        if com_id:
-            invoice_data.commitment_id = com_id
-        if cost_code:
-            invoice_data.cost_code = cost_code
-        return invoice_data, matched_vendor
+        result = _extract_invoice(pdf_hash, pdf_path, filename)
+        # Warm the position-stage preview now, on this thread (PyMuPDF is not thread-safe)
+        _cached_preview(pdf_hash, _pdf_doc())
+        return result
+
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def _cached_preview(pdf_hash: str, _doc):
+    """Rendered placement preview, keyed on the PDF hash (the document itself is not hashed)."""
+    return _render_preview(_doc)
+
+
+def _position_preview():
+    """(zoom, image, width, height) of the placement preview - normally pre-rendered at upload."""
+    return _cached_preview(st.session_state.pdf_hash, _pdf_doc())
 
 
 def main():
+    _sweep_stale_spools()
+    
     # Initialize session state
     if 'stage' not in st.session_state:
         st.session_state.stage = 'upload'
-    if 'pdf_bytes' not in st.session_state:
-        st.session_state.pdf_bytes = None
+    if 'pdf_path' not in st.session_state:
+        st.session_state.pdf_path = None
     if 'stamp_x' not in st.session_state:
         st.session_state.stamp_x = 50
     if 'stamp_y' not in st.session_state:
@@ -255,14 +304,21 @@ def main():
             )
             
             if uploaded_file:
-                st.session_state.pdf_bytes = uploaded_file.read()
-                st.session_state.filename = uploaded_file.name
-                invoice_data, matched_vendor = process_invoice(
-                    st.session_state.pdf_bytes,
-                    st.session_state.filename
-                )
-                st.session_state.invoice_data = invoice_data
-                st.session_state.matched_vendor = matched_vendor
+                pdf_bytes = uploaded_file.getvalue()
+                pdf_hash = hashlib.sha1(pdf_bytes).hexdigest()
+                # Same document as last time: keep the extracted data, skip OCR
+                if st.session_state.get('pdf_hash') != pdf_hash:
+                    _release_upload()
+                    st.session_state.pdf_path = _spool(pdf_bytes, ".pdf")
+                    st.session_state.pdf_hash = pdf_hash
+                    st.session_state.filename = uploaded_file.name
+                    invoice_data, matched_vendor = process_invoice(
+                        st.session_state.pdf_path,
+                        uploaded_file.name,
+                        pdf_hash
+                    )
+                    st.session_state.invoice_data = invoice_data
+                    st.session_state.matched_vendor = matched_vendor
                 st.session_state.stage = 'verify'
                 st.rerun()
     
@@ -270,15 +326,13 @@ def main():
     elif st.session_state.stage == 'verify':
         show_progress('verify')
         
-        from modules.lookup import get_lookup
-        
         data = st.session_state.invoice_data
         lookup = get_lookup()
         
-        # Get all options from CSV
-        all_vendors = sorted([v for v in lookup.list_vendors() if v])
-        all_commitment_ids = sorted([str(c) for c in lookup.df['commitment_id'].unique() if c])
-        all_cost_codes = sorted([str(c) for c in lookup.df['cost_code'].unique() if c])
+        # Get all options from CSV (precomputed when the lookup is loaded)
+        all_vendors = lookup.vendor_options
+        all_commitment_ids = lookup.commitment_options
+        all_cost_codes = lookup.cost_code_options
         
         col1, col2, col3 = st.columns([1, 2, 1])
         with col2:
@@ -303,8 +357,9 @@ def main():
                             del st.session_state[key]
                     # Re-process
                     new_invoice_data, new_matched_vendor = process_invoice(
-                        st.session_state.pdf_bytes,
-                        st.session_state.filename
+                        st.session_state.pdf_path,
+                        st.session_state.filename,
+                        st.session_state.pdf_hash
                     )
                     st.session_state.invoice_data = new_invoice_data
                     st.session_state.matched_vendor = new_matched_vendor
@@ -322,11 +377,11 @@ def main():
             with c1:
                 # Vendor dropdown
                 vendor_options = [""] + all_vendors
-                default_vendor_idx = 0
-                if data.vendor_name and data.vendor_name in vendor_options:
-                    default_vendor_idx = vendor_options.index(data.vendor_name)
-                elif st.session_state.matched_vendor and st.session_state.matched_vendor in vendor_options:
-                    default_vendor_idx = vendor_options.index(st.session_state.matched_vendor)
+                default_vendor_idx = _option_index(
+                    lookup.vendor_index,
+                    data.vendor_name,
+                    st.session_state.matched_vendor
+                )
                 
                 vendor = st.selectbox(
                     "Vendor Name",
@@ -337,9 +392,7 @@ def main():
                 
                 # Commitment ID
                 commitment_options = [""] + all_commitment_ids
-                default_commit_idx = 0
-                if data.commitment_id and data.commitment_id in commitment_options:
-                    default_commit_idx = commitment_options.index(data.commitment_id)
+                default_commit_idx = _option_index(lookup.commitment_index, data.commitment_id)
                 
                 commitment_id = st.selectbox(
                     "Commitment ID",
@@ -349,9 +402,7 @@ def main():
                 
                 # Cost Code
                 cost_code_options = [""] + all_cost_codes
-                default_cost_idx = 0
-                if data.cost_code and data.cost_code in cost_code_options:
-                    default_cost_idx = cost_code_options.index(data.cost_code)
+                default_cost_idx = _option_index(lookup.cost_code_index, data.cost_code)
                 
                 cost_code = st.selectbox(
                     "Cost Code",
@@ -417,28 +468,15 @@ def main():
             # Stamp Preview
             st.markdown("---")
             st.markdown("**Your approval stamp will look like this:**")
-            preview_date = datetime.datetime.now().strftime("%-m/%-d/%Y")
+            preview_date = format_stamp_date()
             
-            stamp_preview_html = f"""
-            <div style="
-                border: 2px solid #333;
-                border-radius: 4px;
-                padding: 12px 15px;
-                background: white;
-                font-family: 'Helvetica', sans-serif;
-                font-size: 13px;
-                line-height: 1.6;
-                max-width: 200px;
-                box-shadow: 2px 2px 5px rgba(0,0,0,0.1);
-            ">
-                <div><strong>COM:</strong> {commitment_id or '____________'}</div>
-                <div><strong>C.C:</strong> {cost_code or '____________'}</div>
-                <div><strong>DUE:</strong> ${amount_due:,.2f}</div>
-                <div><strong>RET:</strong> ${retainage:,.2f}</div>
-                <div><strong>By:</strong> Alan Sar Shalom</div>
-                <div><strong>Date:</strong> {preview_date}</div>
-            </div>
-            """
+            stamp_preview_html = _STAMP_PREVIEW_TMPL.format_map({
+                'com': commitment_id or '____________',
+                'cc': cost_code or '____________',
+                'due': f"{amount_due:,.2f}",
+                'ret': f"{retainage:,.2f}",
+                'date': preview_date,
+            })
             st.markdown(stamp_preview_html, unsafe_allow_html=True)
             
             st.markdown("---")
@@ -464,8 +502,6 @@ def main():
     elif st.session_state.stage == 'position':
         show_progress('position')
         
-        from modules.stamper import get_pdf_preview, get_pdf_dimensions
-        
         st.markdown("### 📍 Place Your Stamp")
         
         st.markdown("""
@@ -473,166 +509,55 @@ def main():
             <strong>How to place your stamp:</strong><br>
             1️⃣ <strong>Drag</strong> the blue box to where you want the stamp<br>
             2️⃣ <strong>Resize</strong> by pulling the corner handles (optional)<br>
-            3️⃣ <strong>Click "🔄 Lock Position"</strong> to save your placement<br>
-            4️⃣ <strong>Click "Apply Stamp"</strong> to finish
+            3️⃣ <strong>Click "Apply Stamp"</strong> to finish
         </div>
         """, unsafe_allow_html=True)
         
         st.markdown("""
         <div class="tip">
-            ⚠️ <strong>Important:</strong> You must click <strong>"🔄 Lock Position"</strong> after moving the stamp — otherwise your placement won't be saved!
+            💡 Your placement is saved automatically when you let go of the stamp.
         </div>
         """, unsafe_allow_html=True)
         
         # Get PDF dimensions and generate preview
-        pdf_width, pdf_height = get_pdf_dimensions(st.session_state.pdf_bytes)
-        zoom = 800 / pdf_width
+        zoom, preview_img, canvas_width, canvas_height = _position_preview()
         st.session_state.zoom = zoom
         
-        preview_png, canvas_width, canvas_height = get_pdf_preview(
-            st.session_state.pdf_bytes, 
-            zoom=zoom
-        )
-        
-        img_b64 = base64.b64encode(preview_png).decode()
+        img_url = _media_url(preview_img, "image/webp", "position_preview")
         
         init_x = int(st.session_state.stamp_x)
         init_y = int(st.session_state.stamp_y)
         init_w = int(st.session_state.stamp_w)
         init_h = int(st.session_state.stamp_h)
         
-        # Drag-and-drop canvas
-        canvas_html = f"""
-        <style>
-            #canvas-container {{ position: relative; display: inline-block; user-select: none; }}
-            #pdf-image {{ display: block; border: 1px solid #e2e8f0; border-radius: 4px; }}
-            #stamp-box {{
-                position: absolute;
-                border: 3px solid #2563eb;
-                background: rgba(37, 99, 235, 0.15);
-                cursor: move;
-                box-sizing: border-box;
-            }}
-            .resize-handle {{
-                position: absolute; width: 14px; height: 14px;
-                background: #2563eb; border: 2px solid white; border-radius: 2px;
-            }}
-            .resize-handle.nw {{ top: -7px; left: -7px; cursor: nw-resize; }}
-            .resize-handle.ne {{ top: -7px; right: -7px; cursor: ne-resize; }}
-            .resize-handle.sw {{ bottom: -7px; left: -7px; cursor: sw-resize; }}
-            .resize-handle.se {{ bottom: -7px; right: -7px; cursor: se-resize; }}
-            #stamp-label {{
-                position: absolute; top: 50%; left: 50%;
-                transform: translate(-50%, -50%);
-                color: #1d4ed8; font-weight: bold; font-size: 14px;
-                pointer-events: none; text-shadow: 1px 1px 2px white;
-            }}
-            #coords-display {{
-                margin-top: 10px; padding: 10px 15px;
-                background: #f0f9ff; border-radius: 6px;
-                font-family: monospace; font-size: 13px;
-            }}
-        </style>
-        <div id="canvas-container">
-            <img id="pdf-image" src="data:image/png;base64,{img_b64}" width="{canvas_width}" height="{canvas_height}">
-            <div id="stamp-box" style="left:{init_x}px;top:{init_y}px;width:{init_w}px;height:{init_h}px;">
-                <span id="stamp-label">STAMP</span>
-                <div class="resize-handle nw" data-resize="nw"></div>
-                <div class="resize-handle ne" data-resize="ne"></div>
-                <div class="resize-handle sw" data-resize="sw"></div>
-                <div class="resize-handle se" data-resize="se"></div>
-            </div>
-        </div>
-        <div id="coords-display">
-            📍 Position: (<span id="pos-x">{init_x}</span>, <span id="pos-y">{init_y}</span>) | 
-            📐 Size: <span id="size-w">{init_w}</span> × <span id="size-h">{init_h}</span> px
-        </div>
-        <script>
-            const box = document.getElementById('stamp-box');
-            let isDragging = false, isResizing = false, resizeDir = '';
-            let startX, startY, startLeft, startTop, startWidth, startHeight;
-            
-            function updatePosition() {{
-                const x = Math.round(parseFloat(box.style.left));
-                const y = Math.round(parseFloat(box.style.top));
-                const w = Math.round(parseFloat(box.style.width));
-                const h = Math.round(parseFloat(box.style.height));
-                document.getElementById('pos-x').textContent = x;
-                document.getElementById('pos-y').textContent = y;
-                document.getElementById('size-w').textContent = w;
-                document.getElementById('size-h').textContent = h;
-                localStorage.setItem('stampPosition', JSON.stringify({{x:x, y:y, w:w, h:h}}));
-            }}
-            
-            localStorage.setItem('stampPosition', JSON.stringify({{x:{init_x}, y:{init_y}, w:{init_w}, h:{init_h}}}));
-            
-            box.addEventListener('mousedown', function(e) {{
-                if (e.target.classList.contains('resize-handle')) {{
-                    isResizing = true;
-                    resizeDir = e.target.dataset.resize;
-                }} else {{ isDragging = true; }}
-                startX = e.clientX; startY = e.clientY;
-                startLeft = parseFloat(box.style.left); startTop = parseFloat(box.style.top);
-                startWidth = parseFloat(box.style.width); startHeight = parseFloat(box.style.height);
-                e.preventDefault();
-            }});
-            
-            document.addEventListener('mousemove', function(e) {{
-                if (isDragging) {{
-                    let newLeft = Math.max(0, Math.min(startLeft + e.clientX - startX, {canvas_width} - parseFloat(box.style.width)));
-                    let newTop = Math.max(0, Math.min(startTop + e.clientY - startY, {canvas_height} - parseFloat(box.style.height)));
-                    box.style.left = newLeft + 'px'; box.style.top = newTop + 'px';
-                    updatePosition();
-                }}
-                if (isResizing) {{
-                    let dx = e.clientX - startX, dy = e.clientY - startY;
-                    let newW = startWidth, newH = startHeight, newL = startLeft, newT = startTop;
-                    if (resizeDir.includes('e')) newW = Math.max(60, startWidth + dx);
-                    if (resizeDir.includes('w')) {{ newW = Math.max(60, startWidth - dx); newL = startLeft + startWidth - newW; }}
-                    if (resizeDir.includes('s')) newH = Math.max(40, startHeight + dy);
-                    if (resizeDir.includes('n')) {{ newH = Math.max(40, startHeight - dy); newT = startTop + startHeight - newH; }}
-                    box.style.width = newW + 'px'; box.style.height = newH + 'px';
-                    box.style.left = newL + 'px'; box.style.top = newT + 'px';
-                    updatePosition();
-                }}
-            }});
-            
-            document.addEventListener('mouseup', function() {{ isDragging = false; isResizing = false; }});
-        </script>
-        """
-        
-        components.html(canvas_html, height=canvas_height + 80)
-        
-        # Read position from localStorage
-        position_json = streamlit_js_eval(
-            js_expressions="localStorage.getItem('stampPosition')",
-            key=f"read_pos_{st.session_state.get('pos_read_key', 0)}"
+        # Drag-and-drop canvas (reports the placement back on mouse release)
+        pos = _stamp_canvas(
+            img_url=img_url,
+            width=canvas_width,
+            height=canvas_height,
+            x=init_x,
+            y=init_y,
+            w=init_w,
+            h=init_h,
+            key="stamp_canvas",
+            default=None
         )
         
-        if position_json:
-            try:
-                pos = json.loads(position_json)
-                st.session_state.stamp_x = pos['x']
-                st.session_state.stamp_y = pos['y']
-                st.session_state.stamp_w = pos['w']
-                st.session_state.stamp_h = pos['h']
-            except:
-                pass
+        if pos:
+            st.session_state.stamp_x = pos['x']
+            st.session_state.stamp_y = pos['y']
+            st.session_state.stamp_w = pos['w']
+            st.session_state.stamp_h = pos['h']
         
         st.markdown("---")
         
-        col1, col2, col3 = st.columns(3)
+        col1, col2 = st.columns(2)
         with col1:
             if st.button("← Back", use_container_width=True):
                 st.session_state.stage = 'verify'
                 st.rerun()
         with col2:
-            if st.button("🔄 Lock Position", use_container_width=True, type="secondary"):
-                st.session_state.pos_read_key = st.session_state.get('pos_read_key', 0) + 1
-                st.rerun()
-        with col3:
             if st.button("✓ Apply Stamp", type="primary", use_container_width=True):
-                st.session_state.pos_read_key = st.session_state.get('pos_read_key', 0) + 1
                 st.session_state.stage = 'generate'
                 st.rerun()
     
@@ -640,13 +565,11 @@ def main():
     elif st.session_state.stage == 'generate':
         show_progress('position')
         
-        from modules.stamper import stamp_pdf_at_position, get_pdf_preview
-        
         with st.spinner("Applying stamp to PDF..."):
             final = st.session_state.final_data
             
             output_bytes, debug_info = stamp_pdf_at_position(
-                pdf_bytes=st.session_state.pdf_bytes,
+                pdf_path=st.session_state.pdf_path,
                 commitment_id=final['commitment_id'],
                 cost_code=final['cost_code'],
                 amount_due=final['amount_due'],
@@ -660,11 +583,24 @@ def main():
                 debug=True
             )
             
-            st.session_state.output_bytes = output_bytes
+            _discard_spooled('output_path', 'preview_path')
+            st.session_state.output_path = _spool(output_bytes, ".pdf")
             st.session_state.debug_info = debug_info
             
-            preview_png, _, _ = get_pdf_preview(output_bytes, zoom=st.session_state.zoom)
-            st.session_state.preview_png = preview_png
+            # Draw the stamp onto the placement preview instead of re-rasterizing the PDF
+            _, preview_img, _, _ = _position_preview()
+            preview_png = composite_stamp_preview(
+                preview_img,
+                debug_info['text_content'],
+                canvas_x=st.session_state.stamp_x,
+                canvas_y=st.session_state.stamp_y,
+                canvas_w=st.session_state.stamp_w,
+                canvas_h=st.session_state.stamp_h,
+                fontsize=debug_info['fontsize'],
+                zoom=st.session_state.zoom,
+                textbox_rc=debug_info['textbox_rc']
+            )
+            st.session_state.preview_path = _spool(preview_png, ".png")
             st.session_state.stage = 'preview'
             st.rerun()
     
@@ -680,7 +616,13 @@ def main():
         </div>
         """, unsafe_allow_html=True)
         
-        st.image(st.session_state.preview_png, width=800)
+        if st.session_state.debug_info['textbox_rc'] < 0:
+            st.warning(
+                "⚠️ The stamp box is too small for the stamp text, so the stamped PDF "
+                "has an empty box. Click **Move Stamp** and make the box bigger."
+            )
+        
+        st.image(st.session_state.preview_path, width=800)
         
         st.markdown("---")
         
@@ -716,7 +658,7 @@ def main():
             
             st.download_button(
                 "📥 Download PDF",
-                st.session_state.output_bytes,
+                Path(st.session_state.output_path).read_bytes(),
                 output_filename,
                 "application/pdf",
                 use_container_width=True
@@ -732,8 +674,8 @@ def main():
                     st.rerun()
             with c2:
                 if st.button("🔄 Process Another Invoice", type="primary", use_container_width=True):
-                    for key in list(st.session_state.keys()):
-                        del st.session_state[key]
+                    _release_upload()
+                    st.session_state.clear()
                     st.rerun()
     
     # Footer on all pages
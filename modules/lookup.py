@@ -2,11 +2,70 @@
 Lookup Module - CSV-based vendor → Commitment ID + Cost Code lookup
 """
 
+import csv
 import os
+import re
 from pathlib import Path
 from typing import Optional, Tuple
-import pandas as pd
-from thefuzz import fuzz, process
+import numpy as np
+from rapidfuzz import fuzz, process
+from rapidfuzz.distance import Levenshtein
+from rapidfuzz.utils import default_process
+
+
+# Max distinct (vendor_name, threshold) lookups memoized per VendorLookup
+CODES_CACHE_SIZE = 1024
+
+# Max edit distance for the BK-tree near-exact pass (OCR typos)
+NEAR_MATCH_DISTANCE = 2
+
+# Trailing legal suffix, stripped so queries aren't scored on shared "Corp"/"Inc" tokens
+_SUFFIX_RE = re.compile(r'\s+(Corp|Corporation|Inc|LLC|Co\.?|Company|Ltd)\.?$', re.IGNORECASE)
+
+
+class _BKTree:
+    """
+    BK-tree over strings keyed on Levenshtein distance.
+    Finds near-exact keys while skipping subtrees the triangle inequality rules out.
+    """
+    
+    def __init__(self, items):
+        # Node layout: [key, value, {distance: child}]
+        self._root = None
+        for key, value in items:
+            self.add(key, value)
+    
+    def add(self, key: str, value):
+        """Insert key; duplicate keys keep their first value."""
+        node = [key, value, {}]
+        if self._root is None:
+            self._root = node
+            return
+        current = self._root
+        while True:
+            dist = Levenshtein.distance(key, current[0])
+            if dist == 0:
+                return
+            child = current[2].get(dist)
+            if child is None:
+                current[2][dist] = node
+                return
+            current = child
+    
+    def search(self, key: str, max_distance: int):
+        """Return (distance, value) of the closest key within max_distance, or None."""
+        if self._root is None:
+            return None
+        best = None
+        stack = [self._root]
+        while stack:
+            node_key, value, children = stack.pop()
+            dist = Levenshtein.distance(key, node_key)
+            if dist <= max_distance and (best is None or (dist, value) < best):
+                best = (dist, value)
+            lo, hi = dist - max_distance, dist + max_distance
+            stack.extend(child for d, child in children.items() if lo <= d <= hi)
+        return best
 
 
 class VendorLookup:
@@ -27,16 +86,56 @@ class VendorLookup:
             module_dir = Path(__file__).parent.parent
             csv_path = module_dir / "data" / "commitments.csv"
         
-        self.df = pd.read_csv(csv_path)
-        self.df.columns = ['commitment_id', 'vendor', 'cost_code']
+        # Columns: commitment_id, vendor, cost_code (header row skipped, blank lines ignored).
+        # Cells are stripped and short rows padded in the same pass that reads them.
+        with open(csv_path, newline='', encoding='utf-8-sig') as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            rows = [
+                [cell.strip() for cell in row[:3]] + [''] * (3 - len(row))
+                for row in reader if row
+            ]
+        
+        # Build vendor list for fuzzy matching, plus parallel code columns
+        self._commitment_ids, self.vendors, self._cost_codes = (
+            tuple(zip(*rows)) if rows else ((), (), ())
+        )
+        
+        # Lowercase vendor → first row index, for O(1) exact matches
+        self._exact = {}
+        for i, v in enumerate(self.vendors):
+            if v:
+                self._exact.setdefault(v.lower(), i)
         
-        # Clean up data
-        self.df['vendor'] = self.df['vendor'].fillna('').str.strip()
-        self.df['cost_code'] = self.df['cost_code'].fillna('').str.strip()
-        self.df['commitment_id'] = self.df['commitment_id'].fillna('').str.strip()
+        # Normalized vendor names indexed for near-exact (typo) lookups
+        self._processed_vendors = [default_process(v) for v in self.vendors]
+        self._bktree = _BKTree((p, i) for i, p in enumerate(self._processed_vendors) if p)
         
-        # Build vendor list for fuzzy matching
-        self.vendors = self.df['vendor'].tolist()
+        # Sorted dropdown options, computed once
+        self.vendor_options = self._sorted_unique(self.vendors)
+        self.commitment_options = self._sorted_unique(self._commitment_ids)
+        self.cost_code_options = self._sorted_unique(self._cost_codes)
+        
+        # Option → position maps so callers don't need list.index()
+        self.vendor_index = {v: i for i, v in enumerate(self.vendor_options)}
+        self.commitment_index = {c: i for i, c in enumerate(self.commitment_options)}
+        self.cost_code_index = {c: i for i, c in enumerate(self.cost_code_options)}
+        
+        # Memo of get_codes results - repeat vendors skip fuzzy matching
+        self._codes_cache = {}
+    
+    def _codes_at(self, idx: int) -> Tuple[Optional[str], Optional[str], str]:
+        """Return (commitment_id, cost_code, vendor) for a row, with blanks as None."""
+        return (
+            self._commitment_ids[idx] or None,
+            self._cost_codes[idx] or None,
+            self.vendors[idx]
+        )
+    
+    @staticmethod
+    def _sorted_unique(values) -> list:
+        """Return sorted unique non-empty values of a column."""
+        return sorted({v for v in values if v})
     
     def get_codes(self, vendor_name: str, threshold: int = 70) -> Tuple[Optional[str], Optional[str], Optional[str]]:
         """
@@ -53,57 +152,66 @@ class VendorLookup:
         if not vendor_name:
             return None, None, None
         
-        # Normalize vendor name - remove common suffixes
-        import re
-        normalized = re.sub(r'\s+(Corp|Corporation|Inc|LLC|Co\.?|Company|Ltd)\.?$', '', vendor_name, flags=re.IGNORECASE).strip()
+        key = (vendor_name, threshold)
+        if key not in self._codes_cache:
+            if len(self._codes_cache) >= CODES_CACHE_SIZE:
+                self._codes_cache.clear()
+            self._codes_cache[key] = self._match_codes(vendor_name, threshold)
+        return self._codes_cache[key]
+    
+    def _match_codes(self, vendor_name: str, threshold: int) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+        """Uncached exact-then-fuzzy match behind get_codes."""
+        # Try the name as given, then without a trailing legal suffix
+        stripped = _SUFFIX_RE.sub('', vendor_name).strip()
         
         # Try exact match first (case-insensitive)
-        for name_to_try in [vendor_name, normalized]:
-            exact_match = self.df[self.df['vendor'].str.lower() == name_to_try.lower()]
-            if not exact_match.empty:
-                row = exact_match.iloc[0]
-                return (
-                    row['commitment_id'] if row['commitment_id'] else None,
-                    row['cost_code'] if row['cost_code'] else None,
-                    row['vendor']
-                )
-        
-        # Try fuzzy matching with multiple strategies
-        best_match = None
-        best_score = 0
-        
-        for name_to_try in [vendor_name, normalized]:
-            # Strategy 1: Token sort ratio (handles word order)
-            result = process.extractOne(
-                name_to_try, 
-                self.vendors, 
-                scorer=fuzz.token_sort_ratio
-            )
-            if result and result[1] > best_score:
-                best_match = result
-                best_score = result[1]
-            
-            # Strategy 2: Partial ratio (handles substrings)
-            result2 = process.extractOne(
-                name_to_try, 
-                self.vendors, 
-                scorer=fuzz.partial_ratio
-            )
-            if result2 and result2[1] > best_score:
-                best_match = result2
-                best_score = result2[1]
-        
-        if best_match and best_score >= threshold:
-            matched_vendor = best_match[0]
-            row = self.df[self.df['vendor'] == matched_vendor].iloc[0]
-            return (
-                row['commitment_id'] if row['commitment_id'] else None,
-                row['cost_code'] if row['cost_code'] else None,
-                matched_vendor
-            )
+        for name in (vendor_name, stripped):
+            idx = self._exact.get(name.lower())
+            if idx is not None:
+                return self._codes_at(idx)
+        
+        # Nothing left to fuzzy-match once punctuation/case is normalized away
+        query = default_process(vendor_name)
+        if not query or not self.vendors:
+            return None, None, None
+        queries = [query, default_process(stripped)]
+        
+        # Near-exact match: a few OCR typos away from a known vendor
+        for q in queries:
+            hit = self._bktree.search(q, NEAR_MATCH_DISTANCE)
+            if hit is not None:
+                idx = hit[1]
+                if fuzz.ratio(q, self._processed_vendors[idx]) >= threshold:
+                    return self._codes_at(idx)
+        
+        # Fuzzy match: token set ratio handles word order and extra tokens,
+        # then partial ratio (substrings, typo'd long names) only if that missed
+        for scorer in (fuzz.token_set_ratio, fuzz.partial_ratio):
+            idx = self._best_fuzzy(queries, scorer, threshold)
+            if idx is not None:
+                return self._codes_at(idx)
         
         return None, None, None
     
+    def _best_fuzzy(self, queries: list, scorer, threshold: int) -> Optional[int]:
+        """Row index of the best-scoring vendor over all queries, or None below threshold.
+        
+        Queries must already be normalized with default_process, like the choices.
+        """
+        scores = process.cdist(
+            queries,
+            self._processed_vendors,
+            scorer=scorer,
+            processor=None,
+            score_cutoff=threshold,
+            dtype=np.uint8,
+            workers=-1
+        )
+        _, best_idx = np.unravel_index(int(scores.argmax()), scores.shape)
+        if scores.max() >= threshold:
+            return int(best_idx)
+        return None
+    
     def list_vendors(self) -> list:
         """Return list of all vendors in the CSV."""
         return [v for v in self.vendors if v]
@@ -141,6 +249,9 @@ if __name__ == "__main__":
         "Lima Electric LLC",
         "Archon Air",  # Partial match test
         "Bello",       # Partial match test
+        "Ballo Construction Corporation",  # Typo + legal suffix
+        "Dynatech Engineering Colp Inc",   # Typo + stacked suffixes
+        "Archn Air Managment Corp",        # Typos in a long name
         "Unknown Vendor",  # Should fail
     ]
     
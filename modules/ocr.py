@@ -6,13 +6,14 @@ No system dependencies required (no poppler/tesseract)
 import fitz  # PyMuPDF
 
 
-def extract_text_from_pdf(pdf_path: str = None, pdf_bytes: bytes = None) -> str:
+def extract_text_from_pdf(pdf_path: str = None, pdf_bytes: bytes = None, max_pages: int = 2) -> str:
     """
     Extract text from a PDF using PyMuPDF.
     
     Args:
         pdf_path: Path to PDF file (optional)
         pdf_bytes: PDF file bytes (optional, for Streamlit uploads)
+        max_pages: Read at most this many pages (default 2)
     
     Returns:
         Extracted text as string
@@ -26,7 +27,7 @@ def extract_text_from_pdf(pdf_path: str = None, pdf_bytes: bytes = None) -> str:
     
     # Extract text from first page (AIA G702 forms are usually single page)
     all_text = []
-    for page_num in range(min(len(doc), 2)):  # First 2 pages max
+    for page_num in range(min(len(doc), max_pages)):
         page = doc[page_num]
         text = page.get_text()
         all_text.append(text)
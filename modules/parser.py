@@ -8,6 +8,95 @@ from typing import Optional
 from decimal import Decimal, InvalidOperation
 
 
+class _CurrencyTable(dict):
+    """str.translate table that keeps decimal digits and '.' and deletes every other code point."""
+    
+    def __missing__(self, codepoint: int):
+        # Same set as the regex [^\d.]: any Unicode decimal digit survives
+        kept = codepoint if chr(codepoint).isdecimal() else None
+        self[codepoint] = kept
+        return kept
+
+
+_CURRENCY_TABLE = _CurrencyTable({ord('.'): ord('.')})
+
+# Patterns are compiled once at import
+_WHITESPACE_RE = re.compile(r'\s+')
+
+# Company name patterns (entities ending in Corp, Inc, LLC, etc.) - case sensitive to get proper names
+_VENDOR_RE = re.compile(r'\b([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*\s+(?:Corp|Corporation|Inc|LLC|Co\.|Company|Management|Construction|Electric|Plumbing|Air))\b')
+_CONTRACTOR_RE = re.compile(r'CONTRACTOR:\s*([A-Za-z][A-Za-z0-9\s&\-\.]+)', re.IGNORECASE)
+
+# Invoice field patterns, in priority order; each has exactly one capture group
+_FIELD_PATTERNS = {
+    'total_completed': (
+        r'TOTAL\s+COMPLETED\s*[&+]\s*STORED\s+TO\s+DATE\s*\$?\s*([\d,]+\.?\d*)',
+        r'4\.\s*TOTAL\s+COMPLETED.*?\$\s*([\d,]+\.?\d*)',
+        r'Line\s+4.*?\$\s*([\d,]+\.?\d*)',
+    ),
+    'current_payment_due': (
+        # Look for stamp DUE first (most reliable)
+        r'DUE:\s*\$\s*([\d,]+\.?\d*)',
+        # Line 8 pattern
+        r'8\.\s*CURRENT\s+PAYMENT\s+DUE\s*\$?\s*([\d,]+\.?\d*)',
+        # General current payment due
+        r'CURRENT\s+PAYMENT\s+DUE\s*\$?\s*([\d,]+\.?\d*)',
+        # Look for pattern near "930" with $ before it
+        r'\$\s*([\d,]+\.[\d]{2})\s*\]?\s*$',
+    ),
+    'total_earned_less_retainage': (
+        r'TOTAL\s+EARNED\s+LESS\s+RETAINAGE[^$]*\$\s*([\d,]+\.?\d*)',
+        r'6\.\s*TOTAL\s+EARNED\s+LESS\s+RETAINAGE.*?\$\s*([\d,]+\.?\d*)',
+        r'Line\s+6.*?\$\s*([\d,]+\.?\d*)',
+    ),
+    'retainage': (
+        # Look for stamp RET first (most reliable)
+        r'RET:\s*\$\s*([\d,]+\.?\d*)',
+        # Then look for Total Retainage with $ sign
+        r'Total\s+Retainage[^$]*\$\s*([\d,]+\.?\d*)',
+        # Generic retainage pattern
+        r'RETAINAGE[^$]*\$\s*([\d,]+\.?\d*)',
+    ),
+    'commitment_id': (
+        r'COM:\s*([A-Za-z0-9\-]+)',
+    ),
+    'cost_code': (
+        r'[Cc]\.?[Cc]\.?:\s*([\d\-]+)',
+    ),
+}
+
+# All field patterns fused into one alternation. Wrapping it in a lookahead keeps
+# matches zero-width, so overlapping fields (e.g. "TOTAL EARNED LESS RETAINAGE $x"
+# also contains "RETAINAGE $x") are each still seen in a single pass over the text.
+_FIELDS_RE = re.compile(
+    '(?=' + '|'.join(
+        f'(?P<{field}_{i}>{pattern})'
+        for field, patterns in _FIELD_PATTERNS.items()
+        for i, pattern in enumerate(patterns)
+    ) + ')',
+    re.IGNORECASE | re.MULTILINE
+)
+
+
+def _scan_fields(text: str) -> dict:
+    """Scan text once; map each pattern's group name to its first captured value."""
+    found = {}
+    for match in _FIELDS_RE.finditer(text):
+        name = match.lastgroup
+        if name not in found:
+            # The pattern's own capture group directly follows its named wrapper
+            found[name] = match.group(_FIELDS_RE.groupindex[name] + 1)
+    return found
+
+
+def _field_values(fields: dict, field: str):
+    """Yield the values captured for a field, in pattern priority order."""
+    for i in range(len(_FIELD_PATTERNS[field])):
+        value = fields.get(f'{field}_{i}')
+        if value is not None:
+            yield value
+
+
 @dataclass
 class InvoiceData:
     """Structured invoice data extracted from OCR"""
@@ -29,7 +118,9 @@ def parse_currency(text: str) -> Optional[Decimal]:
         return None
     
     # Remove $ and commas, keep digits and decimal point
-    cleaned = re.sub(r'[^\d.]', '', text)
+    cleaned = text.translate(_CURRENCY_TABLE)
+    if not cleaned or cleaned == '.':
+        return None
     
     try:
         return Decimal(cleaned)
@@ -43,104 +134,75 @@ def extract_vendor_name(text: str) -> Optional[str]:
     
     Looks for company names ending in Corp, Inc, LLC, Construction, Electric, etc.
     """
-    # Look for company name patterns (entities ending in Corp, Inc, LLC, etc.)
-    company_patterns = [
-        r'\b([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*(?:\s+[A-Z][a-z]+)*\s+(?:Corp|Corporation|Inc|LLC|Co\.|Company|Management|Construction|Electric|Plumbing|Air))\b',
-    ]
-    
-    candidates = []
-    for pattern in company_patterns:
-        matches = re.findall(pattern, text)  # Case sensitive to get proper names
-        for match in matches:
-            vendor = match.strip()
-            vendor = re.sub(r'\s+', ' ', vendor)
-            # Skip if it's the owner company (Shorecrest)
-            if 'shorecrest' in vendor.lower():
-                continue
-            # Skip if it's too short
-            if len(vendor) > 5:
-                candidates.append(vendor)
-    
-    # Return the longest match (usually the full company name)
-    if candidates:
-        return max(candidates, key=len)
+    # Look for company name patterns (entities ending in Corp, Inc, LLC, etc.),
+    # keeping the longest match (usually the full company name); first wins ties
+    best = None
+    best_len = 5  # Skip if it's too short
+    for match in _VENDOR_RE.finditer(text):
+        vendor = _WHITESPACE_RE.sub(' ', match.group(1).strip())
+        # Skip if it's the owner company (Shorecrest)
+        if 'shorecrest' in vendor.lower():
+            continue
+        if len(vendor) > best_len:
+            best, best_len = vendor, len(vendor)
+    
+    if best:
+        return best
     
     # Fallback: Look for "CONTRACTOR:" section
-    contractor_match = re.search(r'CONTRACTOR:\s*([A-Za-z][A-Za-z0-9\s&\-\.]+)', text, re.IGNORECASE)
+    contractor_match = _CONTRACTOR_RE.search(text)
     if contractor_match:
         vendor = contractor_match.group(1).strip()
-        vendor = re.sub(r'\s+', ' ', vendor)
+        vendor = _WHITESPACE_RE.sub(' ', vendor)
         if len(vendor) > 3 and 'shorecrest' not in vendor.lower():
             return vendor
     
     return None
 
 
-def extract_total_completed(text: str) -> Optional[Decimal]:
+def extract_total_completed(text: str, fields: Optional[dict] = None) -> Optional[Decimal]:
     """
     Extract "TOTAL COMPLETED & STORED TO DATE" from AIA G702 form.
     This is line 4 on the form.
     """
-    patterns = [
-        r'TOTAL\s+COMPLETED\s*[&+]\s*STORED\s+TO\s+DATE\s*\$?\s*([\d,]+\.?\d*)',
-        r'4\.\s*TOTAL\s+COMPLETED.*?\$\s*([\d,]+\.?\d*)',
-        r'Line\s+4.*?\$\s*([\d,]+\.?\d*)',
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            return parse_currency(match.group(1))
+    fields = _scan_fields(text) if fields is None else fields
+    for value in _field_values(fields, 'total_completed'):
+        return parse_currency(value)
     
     return None
 
 
-def extract_current_payment_due(text: str) -> Optional[Decimal]:
+def extract_current_payment_due(text: str, fields: Optional[dict] = None) -> Optional[Decimal]:
     """
     Extract "CURRENT PAYMENT DUE" from AIA G702 form.
     This is line 8 on the form - the amount after retainage.
     """
-    patterns = [
-        # Look for stamp DUE first (most reliable)
-        r'DUE:\s*\$\s*([\d,]+\.?\d*)',
-        # Line 8 pattern
-        r'8\.\s*CURRENT\s+PAYMENT\s+DUE\s*\$?\s*([\d,]+\.?\d*)',
-        # General current payment due
-        r'CURRENT\s+PAYMENT\s+DUE\s*\$?\s*([\d,]+\.?\d*)',
-        # Look for pattern near "930" with $ before it
-        r'\$\s*([\d,]+\.[\d]{2})\s*\]?\s*$',
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, text, re.IGNORECASE | re.MULTILINE)
-        if match:
-            amount = parse_currency(match.group(1))
-            if amount and amount > 0:
-                return amount
+    fields = _scan_fields(text) if fields is None else fields
+    for value in _field_values(fields, 'current_payment_due'):
+        amount = parse_currency(value)
+        if amount and amount > 0:
+            return amount
     
     return None
 
 
-def extract_total_earned_less_retainage(text: str) -> Optional[Decimal]:
+def extract_total_earned_less_retainage(text: str, fields: Optional[dict] = None) -> Optional[Decimal]:
     """
     Extract "TOTAL EARNED LESS RETAINAGE" from AIA G702 form.
     This is line 6 on the form.
     """
-    patterns = [
-        r'TOTAL\s+EARNED\s+LESS\s+RETAINAGE[^$]*\$\s*([\d,]+\.?\d*)',
-        r'6\.\s*TOTAL\s+EARNED\s+LESS\s+RETAINAGE.*?\$\s*([\d,]+\.?\d*)',
-        r'Line\s+6.*?\$\s*([\d,]+\.?\d*)',
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            return parse_currency(match.group(1))
+    fields = _scan_fields(text) if fields is None else fields
+    for value in _field_values(fields, 'total_earned_less_retainage'):
+        return parse_currency(value)
     
     return None
 
 
-def extract_retainage(text: str, total_completed: Optional[Decimal] = None) -> Optional[Decimal]:
+def extract_retainage(
+    text: str,
+    total_completed: Optional[Decimal] = None,
+    fields: Optional[dict] = None
+) -> Optional[Decimal]:
     """
     Extract retainage amount from AIA G702 form.
     
@@ -149,25 +211,16 @@ def extract_retainage(text: str, total_completed: Optional[Decimal] = None) -> O
     2. Calculate: Total Completed - Total Earned Less Retainage
     3. Assume 10% of total completed
     """
-    # Method 1: Look for explicit retainage value
-    patterns = [
-        # Look for stamp RET first (most reliable)
-        r'RET:\s*\$\s*([\d,]+\.?\d*)',
-        # Then look for Total Retainage with $ sign
-        r'Total\s+Retainage[^$]*\$\s*([\d,]+\.?\d*)',
-        # Generic retainage pattern
-        r'RETAINAGE[^$]*\$\s*([\d,]+\.?\d*)',
-    ]
+    fields = _scan_fields(text) if fields is None else fields
     
-    for pattern in patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            amount = parse_currency(match.group(1))
-            if amount and amount > 0:
-                return amount
+    # Method 1: Look for explicit retainage value
+    for value in _field_values(fields, 'retainage'):
+        amount = parse_currency(value)
+        if amount and amount > 0:
+            return amount
     
     # Method 2: Calculate from Total Completed - Total Earned Less Retainage
-    total_earned_less_ret = extract_total_earned_less_retainage(text)
+    total_earned_less_ret = extract_total_earned_less_retainage(text, fields)
     if total_completed and total_earned_less_ret:
         calculated_retainage = total_completed - total_earned_less_ret
         if calculated_retainage > 0:
@@ -176,22 +229,18 @@ def extract_retainage(text: str, total_completed: Optional[Decimal] = None) -> O
     return None
 
 
-def extract_existing_stamp(text: str) -> dict:
+def extract_existing_stamp(text: str, fields: Optional[dict] = None) -> dict:
     """
     Extract any existing stamp data from the OCR text.
     Alan's invoices may already have stamps we can read.
     """
+    fields = _scan_fields(text) if fields is None else fields
     stamp_data = {}
     
-    # COM (Commitment ID)
-    com_match = re.search(r'COM:\s*([A-Za-z0-9\-]+)', text, re.IGNORECASE)
-    if com_match:
-        stamp_data['commitment_id'] = com_match.group(1).strip()
-    
-    # C.C (Cost Code)
-    cc_match = re.search(r'[Cc]\.?[Cc]\.?:\s*([\d\-]+)', text)
-    if cc_match:
-        stamp_data['cost_code'] = cc_match.group(1).strip()
+    # COM (Commitment ID), C.C (Cost Code)
+    for key in ('commitment_id', 'cost_code'):
+        for value in _field_values(fields, key):
+            stamp_data[key] = value.strip()
     
     return stamp_data
 
@@ -209,12 +258,15 @@ def parse_invoice(text: str) -> InvoiceData:
     # Extract vendor name
     vendor_name = extract_vendor_name(text) or "Unknown Vendor"
     
+    # Scan the text once for every labeled field
+    fields = _scan_fields(text)
+    
     # Extract amounts
-    total_completed = extract_total_completed(text)
-    current_payment = extract_current_payment_due(text)
+    total_completed = extract_total_completed(text, fields)
+    current_payment = extract_current_payment_due(text, fields)
     
     # Extract retainage (pass total_completed for fallback calculation)
-    retainage = extract_retainage(text, total_completed)
+    retainage = extract_retainage(text, total_completed, fields)
     
     # Calculate if not explicitly found
     if total_completed and not current_payment:
@@ -229,7 +281,7 @@ def parse_invoice(text: str) -> InvoiceData:
         retainage = (current_payment * Decimal('0.1111')).quantize(Decimal('1'))
     
     # Try to extract any existing stamp data
-    stamp_data = extract_existing_stamp(text)
+    stamp_data = extract_existing_stamp(text, fields)
     
     return InvoiceData(
         vendor_name=vendor_name,
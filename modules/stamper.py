@@ -4,13 +4,23 @@ Handles rotated PDFs correctly (270° scanned invoices)
 """
 
 import io
-from datetime import datetime
+import functools
+from contextlib import contextmanager
+from datetime import date, datetime
 from typing import Tuple
 import fitz
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+# Color detection thumbnail: a pixel counts as colored when its RGB channels
+# spread by more than COLOR_SPREAD, and the page when enough pixels do
+COLOR_THUMB_WIDTH = 200
+COLOR_SPREAD = 32
+COLOR_PIXEL_FRACTION = 0.0005
 
 
 def stamp_pdf_at_position(
-    pdf_bytes: bytes,
+    pdf_bytes: bytes = None,
     commitment_id: str = "",
     cost_code: str = "",
     amount_due: float = 0.0,
@@ -21,16 +31,19 @@ def stamp_pdf_at_position(
     canvas_w: float = 140,
     canvas_h: float = 80,
     zoom: float = 1.0,
-    debug: bool = False
+    debug: bool = False,
+    page_num: int = 0,
+    pdf_path: str = None
 ) -> Tuple[bytes, dict]:
     """Apply approval stamp at visual canvas position.
     
     Uses page.derotation_matrix to transform visual coordinates
     (what the user sees) to drawing coordinates.
     Text is inserted with rotation to appear upright in rotated pages.
+    The source PDF can be given as pdf_bytes or as a pdf_path on disk.
     """
-    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-    page = doc[0]
+    doc = open_pdf(pdf_bytes, pdf_path)
+    page = doc[page_num]
     
     rotation = page.rotation
     derot = page.derotation_matrix
@@ -41,21 +54,28 @@ def stamp_pdf_at_position(
     stamp_w = canvas_w / zoom
     stamp_h = canvas_h / zoom
     
-    # Transform all 4 visual corners to drawing coordinates
-    corners_visual = [
-        fitz.Point(visual_x, visual_y),
-        fitz.Point(visual_x + stamp_w, visual_y),
-        fitz.Point(visual_x, visual_y + stamp_h),
-        fitz.Point(visual_x + stamp_w, visual_y + stamp_h),
-    ]
-    corners_draw = [c * derot for c in corners_visual]
+    # Transform all 4 visual corners to drawing coordinates in one multiply
+    # (homogeneous row vectors [x, y, 1] against derot's 3x2 affine part)
+    corners_visual = np.array([
+        [visual_x, visual_y, 1],
+        [visual_x + stamp_w, visual_y, 1],
+        [visual_x, visual_y + stamp_h, 1],
+        [visual_x + stamp_w, visual_y + stamp_h, 1],
+    ])
+    derot_affine = np.array([
+        [derot.a, derot.b],
+        [derot.c, derot.d],
+        [derot.e, derot.f],
+    ])
+    corners_draw = corners_visual @ derot_affine
     
     # Bounding rect in drawing coords
-    xs = [c.x for c in corners_draw]
-    ys = [c.y for c in corners_draw]
-    drawing_rect = fitz.Rect(min(xs), min(ys), max(xs), max(ys))
+    x0, y0 = corners_draw.min(axis=0)
+    x1, y1 = corners_draw.max(axis=0)
+    drawing_rect = fitz.Rect(x0, y0, x1, y1)
     
     debug_info = {
+        'page_num': page_num,
         'rotation': rotation,
         'zoom': zoom,
         'visual': {'x': visual_x, 'y': visual_y, 'w': stamp_w, 'h': stamp_h},
@@ -71,13 +91,13 @@ def stamp_pdf_at_position(
     shape.commit()
     
     # Build text content
-    date = datetime.now().strftime("%-m/%-d/%Y")
+    stamp_date = format_stamp_date()
     text_content = f"""COM: {commitment_id or '________'}
 C.C: {cost_code or '________'}
 DUE: ${amount_due:,.2f}
 RET: ${retainage:,.2f}
 By: {approver}
-Date: {date}"""
+Date: {stamp_date}"""
     
     # For rotated pages, determine text rotation to keep upright
     # Text rotation must MATCH page rotation to appear upright
@@ -113,14 +133,9 @@ Date: {date}"""
         available_line_width = text_rect.width - 10
         available_stack_height = text_rect.height - 10
     
-    # Font size from width constraint (0.5 char width ratio for Helvetica)
-    fontsize_w = available_line_width / (len(longest_line) * 0.52)
-    # Font size from height constraint (1.3 line height ratio)
-    fontsize_h = available_stack_height / (num_lines * 1.25)
-    
-    fontsize = min(fontsize_w, fontsize_h)
-    fontsize = max(5, min(fontsize, 10))  # Clamp 5-10pt
+    fontsize = _compute_fontsize(len(longest_line), num_lines, available_line_width, available_stack_height)
     
+    debug_info['text_content'] = text_content
     debug_info['text_rotate'] = text_rotate
     debug_info['text_rect'] = str(text_rect)
     debug_info['fontsize'] = round(fontsize, 1)
@@ -146,31 +161,186 @@ Date: {date}"""
     return output.getvalue(), debug_info
 
 
-def get_pdf_preview(pdf_bytes: bytes, page_num: int = 0, zoom: float = 1.0):
-    """Render PDF page to PNG at given zoom level."""
-    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-    page = doc[page_num]
-    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom))
-    png_bytes = pix.tobytes("png")
-    width, height = pix.width, pix.height
-    doc.close()
-    return png_bytes, width, height
+def format_stamp_date(d: date = None) -> str:
+    """Format a date as M/D/YYYY without zero padding (defaults to today)."""
+    d = d or datetime.now().date()
+    return f"{d.month}/{d.day}/{d.year}"
+
+
+@functools.lru_cache(maxsize=64)
+def _compute_fontsize(
+    n_chars_longest: int,
+    num_lines: int,
+    line_width: float,
+    stack_height: float
+) -> float:
+    """Largest font size (clamped 5-10pt) that fits the stamp text in the box."""
+    # Font size from width constraint (0.5 char width ratio for Helvetica)
+    fontsize_w = line_width / (n_chars_longest * 0.52)
+    # Font size from height constraint (1.3 line height ratio)
+    fontsize_h = stack_height / (num_lines * 1.25)
+    
+    fontsize = min(fontsize_w, fontsize_h)
+    return max(5, min(fontsize, 10))  # Clamp 5-10pt
+
+
+def composite_stamp_preview(
+    preview_bytes: bytes,
+    text_content: str,
+    canvas_x: float,
+    canvas_y: float,
+    canvas_w: float,
+    canvas_h: float,
+    fontsize: float,
+    zoom: float = 1.0,
+    textbox_rc: float = 0.0
+) -> bytes:
+    """Draw the stamp onto an already-rendered page preview, returning PNG bytes.
+    
+    Coordinates are canvas pixels (the same space the user placed the stamp in),
+    so this mirrors stamp_pdf_at_position's visual result without re-parsing
+    and re-rasterizing the stamped PDF. Pass that call's debug_info['textbox_rc']:
+    a negative rc means insert_textbox wrote nothing, so only the empty box is drawn.
+    """
+    img = Image.open(io.BytesIO(preview_bytes)).convert("RGB")
+    draw = ImageDraw.Draw(img)
+    
+    # White background with dark border (matches the PDF shape)
+    draw.rectangle(
+        [canvas_x, canvas_y, canvas_x + canvas_w, canvas_y + canvas_h],
+        fill=(255, 255, 255),
+        outline=(51, 51, 51),
+        width=max(1, round(1.5 * zoom))
+    )
+    
+    # Text is always upright in visual space, whatever the page rotation
+    # (skipped when it overflowed the PDF textbox, which then holds no text)
+    if textbox_rc >= 0:
+        padding = 5 * zoom
+        font_px = fontsize * zoom
+        draw.multiline_text(
+            (canvas_x + padding, canvas_y + padding),
+            text_content,
+            fill=(0, 0, 0),
+            font=ImageFont.load_default(size=font_px),
+            spacing=font_px * 0.2
+        )
+    
+    output = io.BytesIO()
+    img.save(output, "PNG")
+    return output.getvalue()
+
+
+def open_pdf(pdf_bytes: bytes = None, pdf_path: str = None) -> fitz.Document:
+    """Parse a PDF once so the handle can be reused by the read-only helpers below.
+    
+    Opening by path lets MuPDF read the file directly instead of from a Python bytes copy.
+    """
+    if pdf_path:
+        return fitz.open(pdf_path)
+    elif pdf_bytes:
+        return fitz.open(stream=pdf_bytes, filetype="pdf")
+    else:
+        raise ValueError("Must provide either pdf_path or pdf_bytes")
+
+
+@contextmanager
+def _open_page(pdf_bytes: bytes, page_num: int = 0, doc: fitz.Document = None):
+    """Yield page_num of an already-open doc, or of pdf_bytes parsed (and closed) just for this call."""
+    if doc is not None:
+        yield doc[page_num]
+        return
+    doc = open_pdf(pdf_bytes)
+    try:
+        yield doc[page_num]
+    finally:
+        doc.close()
+
+
+def get_pdf_info(
+    pdf_bytes: bytes = None,
+    page_num: int = 0,
+    zoom: float = 1.0,
+    image_format: str = "png",
+    doc: fitz.Document = None,
+    fit_width: float = None,
+    grayscale: bool = False
+) -> dict:
+    """Page metadata and a rendered preview from a single page load.
+    
+    Returns visual_w/visual_h (points, accounting for rotation) and rotation, plus
+    image/width/height/zoom for the render. fit_width picks the zoom that makes the
+    image that many pixels wide; zoom=None (without fit_width) skips rendering.
+    image_format is "png" (lossless), "jpeg" (quality 75, fast to encode) or "webp"
+    (lossy, much smaller - for on-screen previews). grayscale renders a single-channel
+    pixmap, a third of the bytes of RGB (AIA forms are effectively black and white).
+    Pass an already-open doc to skip re-parsing pdf_bytes.
+    """
+    with _open_page(pdf_bytes, page_num, doc) as page:
+        info = {
+            'visual_w': page.rect.width,
+            'visual_h': page.rect.height,
+            'rotation': page.rotation,
+        }
+        if fit_width:
+            zoom = fit_width / page.rect.width
+        if zoom is None:
+            return info
+        
+        # Only page_num is rasterized, regardless of how many pages the document has
+        colorspace = fitz.csGRAY if grayscale else fitz.csRGB
+        pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=colorspace)
+    
+    if image_format == "webp":
+        img = Image.frombytes("L" if grayscale else "RGB", (pix.width, pix.height), pix.samples)
+        buf = io.BytesIO()
+        img.save(buf, "WEBP", quality=82, method=4)
+        img_bytes = buf.getvalue()
+    elif image_format == "jpeg":
+        img_bytes = pix.tobytes("jpeg", jpg_quality=75)
+    else:
+        img_bytes = pix.tobytes("png")
+    info.update(image=img_bytes, width=pix.width, height=pix.height, zoom=zoom)
+    return info
+
 
+def page_has_color(pdf_bytes: bytes = None, page_num: int = 0, doc: fitz.Document = None) -> bool:
+    """True if the page shows any real color (stamps, highlights, signatures in ink).
+    
+    Checked on a small RGB thumbnail, so grayscale rendering can be used only when it
+    loses nothing; slight tints from scanned paper stay below the thresholds.
+    """
+    with _open_page(pdf_bytes, page_num, doc) as page:
+        scale = COLOR_THUMB_WIDTH / page.rect.width
+        pix = page.get_pixmap(matrix=fitz.Matrix(scale, scale), colorspace=fitz.csRGB)
+    rgb = np.frombuffer(pix.samples, dtype=np.uint8).reshape(-1, 3)
+    spread = rgb.max(axis=1) - rgb.min(axis=1)
+    return np.count_nonzero(spread > COLOR_SPREAD) > COLOR_PIXEL_FRACTION * len(rgb)
+
+
+def get_pdf_preview(
+    pdf_bytes: bytes = None,
+    page_num: int = 0,
+    zoom: float = 1.0,
+    image_format: str = "png",
+    doc: fitz.Document = None,
+    grayscale: bool = False
+):
+    """Render a single PDF page to an image at given zoom level.
+    
+    Returns (image_bytes, width, height); see get_pdf_info for the formats.
+    Pass an already-open doc to skip re-parsing pdf_bytes.
+    """
+    info = get_pdf_info(pdf_bytes, page_num, zoom, image_format, doc, grayscale=grayscale)
+    return info['image'], info['width'], info['height']
 
-def get_pdf_dimensions(pdf_bytes: bytes, page_num: int = 0) -> Tuple[float, float]:
+
+def get_pdf_dimensions(pdf_bytes: bytes = None, page_num: int = 0, doc: fitz.Document = None) -> Tuple[float, float]:
     """Get visual dimensions of PDF page (accounting for rotation)."""
-    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-    page = doc[page_num]
-    width = page.rect.width
-    height = page.rect.height
-    doc.close()
-    return width, height
+    info = get_pdf_info(pdf_bytes, page_num, zoom=None, doc=doc)
+    return info['visual_w'], info['visual_h']
 
 
-def get_pdf_rotation(pdf_bytes: bytes, page_num: int = 0) -> int:
+def get_pdf_rotation(pdf_bytes: bytes = None, page_num: int = 0, doc: fitz.Document = None) -> int:
     """Get rotation of PDF page in degrees."""
-    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-    page = doc[page_num]
-    rotation = page.rotation
-    doc.close()
-    return rotation
+    return get_pdf_info(pdf_bytes, page_num, zoom=None, doc=doc)['rotation']